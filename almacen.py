@@ -1,20 +1,50 @@
 # almacen.py
 from pymongo import MongoClient
+import logging
 import os
 from datetime import datetime
 
+from keywords_locales import EstadisticasCorpus
+from relacionados import IndiceRelacionados
+
+log = logging.getLogger(__name__)
+
 class AlmacenMongo:
-    def __init__(self, uri="mongodb://localhost:27017", db_name="cecar_articulos", collection_name="articulos"):
+    def __init__(self, uri="mongodb://localhost:27017", db_name="cecar_articulos", collection_name="articulos",
+                 related_collection="relacionados", related_k=5, keyword_stats_collection="keyword_stats"):
         self.client = MongoClient(uri)
         self.db = self.client[db_name]
         self.col = self.db[collection_name]
         # crear índices útiles
         self.col.create_index("arxiv_id", unique=True, sparse=True)
+        # exportación incremental; created_at solo la usan los artículos anteriores a updated_at
+        self.col.create_index("updated_at")
+        self.col.create_index("created_at")
+        # índice de artículos relacionados (None lo desactiva); el idf sale de las estadísticas de keywords
+        self.relacionados = IndiceRelacionados(
+            self.db, related_collection, k=related_k,
+            estadisticas=EstadisticasCorpus(self.db, keyword_stats_collection)
+        ) if related_collection else None
 
-    def guardar_articulo(self, metadata: dict, text: str, image_paths: list, keywords: list):
+    @classmethod
+    def desde_config(cls, config: dict):
+        mongo_cfg = config.get("mongo", {})
+        return cls(
+            uri=mongo_cfg.get("uri", "mongodb://localhost:27017"),
+            db_name=mongo_cfg.get("db_name", "cecar_articulos"),
+            collection_name=mongo_cfg.get("collection", "articulos"),
+            related_collection=mongo_cfg.get("related_collection", "relacionados"),
+            related_k=int(mongo_cfg.get("related_k", 5)),
+            keyword_stats_collection=mongo_cfg.get("keyword_stats_collection", "keyword_stats")
+        )
+
+    def guardar_articulo(self, metadata: dict, text: str, image_paths: list, keywords: list,
+                         keywords_origen: str = "llm"):
         """
         metadata debe contener: title, authors, published, categories, summary, arxiv_id, pdf_url, xml_source (ruta del xml)
+        updated_at marca cada escritura (lo usa la exportación incremental).
         """
+        ahora = datetime.utcnow()
         doc = {
             "title": metadata.get("title"),
             "authors": metadata.get("authors", []),
@@ -27,13 +57,44 @@ class AlmacenMongo:
             "full_text": text,
             "images": image_paths,
             "keywords": keywords,
-            "created_at": datetime.utcnow()
+            "keywords_origen": keywords_origen,
+            "updated_at": ahora
         }
-        # upsert por arxiv_id si existe, si no insertar
+        # upsert por arxiv_id si existe, si no insertar; created_at es la primera ingesta
         query = {}
         if doc.get("arxiv_id"):
             query = {"arxiv_id": doc["arxiv_id"]}
-            self.col.update_one(query, {"$set": doc}, upsert=True)
+            self.col.update_one(query, {"$set": doc, "$setOnInsert": {"created_at": ahora}}, upsert=True)
         else:
-            self.col.insert_one(doc)
+            self.col.insert_one(dict(doc, created_at=ahora))
+
+        if self.relacionados is not None:
+            try:
+                self.relacionados.indexar(doc)
+            except Exception as e:
+                # el artículo ya está guardado; el índice se puede reconstruir luego
+                log.warning("No se pudo indexar relacionados de %s: %s", doc.get("arxiv_id"), e)
         return True
+
+    def marcar_en_estadisticas(self, arxiv_id: str) -> bool:
+        """
+        Marca el artículo como contado en las estadísticas de keywords.
+        Devuelve True solo la primera vez (la comprobación y la marca son atómicas).
+        """
+        res = self.col.update_one(
+            {"arxiv_id": arxiv_id, "en_keyword_stats": {"$ne": True}},
+            {"$set": {"en_keyword_stats": True}}
+        )
+        return res.modified_count == 1
+
+    def actualizar_keywords(self, arxiv_id: str, keywords: list, origen: str = "llm"):
+        """Reemplaza las keywords de un artículo ya guardado (refinamiento asíncrono)"""
+        self.col.update_one(
+            {"arxiv_id": arxiv_id},
+            {"$set": {"keywords": keywords, "keywords_origen": origen, "updated_at": datetime.utcnow()}}
+        )
+        if self.relacionados is not None:
+            doc = self.col.find_one({"arxiv_id": arxiv_id},
+                                    {"arxiv_id": 1, "title": 1, "summary": 1, "keywords": 1})
+            if doc:
+                self.relacionados.indexar(doc)
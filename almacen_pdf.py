@@ -0,0 +1,326 @@
+# almacen_pdf.py
+import atexit
+import os
+import re
+import json
+import logging
+import time
+import shutil
+import threading
+
+from descargador import Descargador
+
+try:
+    import psutil  # opcional: comprobar si sigue vivo el proceso que fijó una entrada
+except ImportError:
+    psutil = None
+
+log = logging.getLogger(__name__)
+
+_VERSION_RE = re.compile(r"^(?P<base>.+?)(?P<version>v\d+)?$")
+
+# una instancia por directorio raíz, compartida por todos los hilos/trabajos del proceso
+_INSTANCIAS = {}
+_INSTANCIAS_LOCK = threading.Lock()
+
+
+def separar_version(arxiv_id: str) -> tuple:
+    """'2301.01234v2' -> ('2301.01234', 'v2'); sin versión -> ('2301.01234', 'latest')"""
+    m = _VERSION_RE.match(arxiv_id or "")
+    return m.group("base"), m.group("version") or "latest"
+
+
+class AlmacenPDF:
+    """
+    Almacén compartido de PDFs con clave (arXiv ID, versión) y cuota de disco.
+    - Los PDFs viven en <dir>/<id>/<version>.pdf, así el mismo artículo pedido
+      desde distintas búsquedas se descarga una sola vez.
+    - manifest.json registra cada archivo gestionado (PDFs, XMLs de búsqueda y
+      carpetas de imágenes extraídas) con su tamaño y último acceso.
+    - Al superar la cuota se eliminan las entradas menos usadas recientemente,
+      nunca las que están en uso (fijadas) por un procesamiento en curso ni las
+      carpetas de imágenes de artículos guardados (Mongo las referencia y la
+      vista del artículo dejaría de mostrarlas); cuentan para el uso pero solo
+      se desalojan PDFs y XMLs.
+    - Las fijaciones se comparten entre procesos (web y CLI) con un archivo
+      marcador <ruta>.pin.<pid> mientras el proceso tenga la entrada en uso.
+    """
+
+    def __init__(self, root_dir="downloads/pdfs", quota_mb=2048, intervalo_guardado_s=5.0):
+        self.root_dir = os.path.abspath(root_dir)
+        os.makedirs(self.root_dir, exist_ok=True)
+        self.manifest_path = os.path.join(self.root_dir, "manifest.json")
+        self.quota_bytes = int(float(quota_mb) * 1024 * 1024)
+        self.intervalo_guardado_s = intervalo_guardado_s
+        self.descargador = Descargador(self.root_dir)
+
+        self._lock = threading.RLock()
+        self._fijados = {}        # ruta -> contador de usos en curso
+        self._descargas = {}      # ruta -> lock para no descargar dos veces el mismo PDF
+        self._sucio = False
+        self._ultimo_guardado = 0.0
+        self._aviso_cuota = False
+        self._entradas = self._leer_manifest()
+        atexit.register(self._volcar)
+
+    @classmethod
+    def desde_config(cls, config: dict):
+        cfg = config.get("pdf_store", {})
+        root_dir = os.path.abspath(cfg.get("dir", os.path.join(config.get("downloads_dir", "downloads"), "pdfs")))
+        with _INSTANCIAS_LOCK:
+            if root_dir not in _INSTANCIAS:
+                _INSTANCIAS[root_dir] = cls(root_dir, quota_mb=cfg.get("quota_mb", 2048))
+            return _INSTANCIAS[root_dir]
+
+    # ---------- manifest ----------
+    def _leer_manifest(self) -> dict:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _guardar_manifest(self, forzar=False):
+        """
+        Persiste el manifest (escritura atómica). Antes se mezcla con lo que haya
+        en disco para no perder entradas de otros procesos (p. ej. el CLI) y se
+        descartan las entradas cuyo archivo ya no existe (borrado a mano o
+        desalojado por otro proceso), que inflarían el uso.
+        Debe llamarse con self._lock tomado.
+        """
+        if not self._sucio:
+            return
+        if not forzar and time.time() - self._ultimo_guardado < self.intervalo_guardado_s:
+            return
+        for ruta in [r for r in self._entradas if r not in self._fijados and not os.path.exists(r)]:
+            del self._entradas[ruta]
+        for ruta, e in self._leer_manifest().items():
+            propia = self._entradas.get(ruta)
+            if propia is None:
+                if os.path.exists(ruta):
+                    self._entradas[ruta] = e
+            elif e.get("ultimo_acceso", 0) > propia.get("ultimo_acceso", 0):
+                propia["ultimo_acceso"] = e["ultimo_acceso"]
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._entradas, f)
+        os.replace(tmp, self.manifest_path)
+        self._sucio = False
+        self._ultimo_guardado = time.time()
+
+    def _volcar(self):
+        """Guarda los cambios pendientes del guardado diferido (al salir del proceso)"""
+        with self._lock:
+            try:
+                self._guardar_manifest(forzar=True)
+            except OSError as err:
+                log.warning("No se pudo guardar el manifest: %s", err)
+
+    @staticmethod
+    def _tamano(ruta: str) -> int:
+        if os.path.isdir(ruta):
+            total = 0
+            for base, _, archivos in os.walk(ruta):
+                for a in archivos:
+                    try:
+                        total += os.path.getsize(os.path.join(base, a))
+                    except OSError:
+                        pass
+            return total
+        try:
+            return os.path.getsize(ruta)
+        except OSError:
+            return 0
+
+    # ---------- API ----------
+    def ruta_pdf(self, arxiv_id: str) -> str:
+        base, version = separar_version(arxiv_id)
+        return os.path.join(self.root_dir, base.replace("/", "_"), f"{version}.pdf")
+
+    def obtener_pdf(self, arxiv_id: str, pdf_url: str) -> str:
+        """
+        Devuelve la ruta local del PDF, descargándolo solo si no está en el almacén.
+        La ruta queda fijada (no se desaloja) hasta llamar a liberar().
+        """
+        ruta = self.ruta_pdf(arxiv_id)
+        with self._lock:
+            lock_descarga = self._descargas.setdefault(ruta, threading.Lock())
+            self._fijar(ruta)
+
+        try:
+            with lock_descarga:
+                if not os.path.exists(ruta):
+                    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+                    rel = os.path.relpath(ruta, self.root_dir)
+                    self.descargador.descargar_pdf(pdf_url, dest_name=rel)
+                    self.registrar(ruta, "pdf", arxiv_id=arxiv_id)
+                else:
+                    self.tocar(ruta)
+        except Exception:
+            self.liberar(ruta)
+            raise
+        return ruta
+
+    def contiene(self, arxiv_id: str) -> bool:
+        return os.path.exists(self.ruta_pdf(arxiv_id))
+
+    def guardar(self, arxiv_id: str, datos: bytes | None = None, ruta_origen: str | None = None) -> str:
+        """
+        Persiste en el almacén un PDF ya descargado, desde memoria (`datos`) o
+        moviendo un archivo temporal (`ruta_origen`). Devuelve la ruta final.
+        """
+        ruta = self.ruta_pdf(arxiv_id)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        tmp = f"{ruta}.{os.getpid()}.{threading.get_ident()}.part"
+        if datos is not None:
+            with open(tmp, "wb") as f:
+                f.write(datos)
+        else:
+            shutil.move(ruta_origen, tmp)
+        os.replace(tmp, ruta)
+        self.registrar(ruta, "pdf", arxiv_id=arxiv_id)
+        return ruta
+
+    def registrar(self, ruta: str, tipo: str, arxiv_id: str | None = None):
+        """Añade (o actualiza) un archivo o carpeta gestionada y aplica la cuota.
+        El manifest se persiste de forma diferida, como en tocar()."""
+        ruta = os.path.abspath(ruta)
+        with self._lock:
+            self._entradas[ruta] = {
+                "tipo": tipo,
+                "arxiv_id": arxiv_id,
+                "bytes": self._tamano(ruta),
+                "ultimo_acceso": time.time(),
+            }
+            self._sucio = True
+            self._aplicar_cuota(proteger=ruta)
+            self._guardar_manifest()
+
+    def tocar(self, ruta: str):
+        """Marca un acceso (LRU). Barato: el manifest se persiste de forma diferida."""
+        ruta = os.path.abspath(ruta)
+        with self._lock:
+            e = self._entradas.get(ruta)
+            if e is None:
+                return
+            e["ultimo_acceso"] = time.time()
+            self._sucio = True
+            self._guardar_manifest()
+
+    def fijar(self, ruta: str):
+        ruta = os.path.abspath(ruta)
+        with self._lock:
+            self._fijar(ruta)
+
+    def liberar(self, ruta: str):
+        ruta = os.path.abspath(ruta)
+        with self._lock:
+            n = self._fijados.get(ruta, 0) - 1
+            if n > 0:
+                self._fijados[ruta] = n
+            else:
+                self._fijados.pop(ruta, None)
+                self._descargas.pop(ruta, None)
+                try:
+                    os.remove(self._marcador(ruta))
+                except OSError:
+                    pass
+
+    # ---------- fijaciones compartidas entre procesos ----------
+    @staticmethod
+    def _marcador(ruta: str) -> str:
+        return f"{ruta}.pin.{os.getpid()}"
+
+    def _fijar(self, ruta: str):
+        """Debe llamarse con self._lock tomado. La primera fijación crea el marcador."""
+        n = self._fijados.get(ruta, 0)
+        if n == 0:
+            try:
+                os.makedirs(os.path.dirname(ruta), exist_ok=True)
+                open(self._marcador(ruta), "w").close()
+            except OSError as err:
+                log.warning("No se pudo crear el marcador de %s: %s", ruta, err)
+        self._fijados[ruta] = n + 1
+
+    @staticmethod
+    def _proceso_vivo(pid: int) -> bool:
+        if psutil is not None:
+            return psutil.pid_exists(pid)
+        if os.name != "posix":
+            return True  # sin psutil no se puede comprobar: se respeta el marcador
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def _fijado_por_otro(self, ruta: str) -> bool:
+        """¿Otro proceso vivo tiene la entrada en uso? Los marcadores huérfanos se borran."""
+        carpeta, nombre = os.path.split(ruta)
+        prefijo = nombre + ".pin."
+        try:
+            marcadores = [m for m in os.listdir(carpeta) if m.startswith(prefijo)]
+        except OSError:
+            return False
+        fijado = False
+        for m in marcadores:
+            pid = m[len(prefijo):]
+            if not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            if self._proceso_vivo(int(pid)):
+                fijado = True
+            else:
+                try:
+                    os.remove(os.path.join(carpeta, m))
+                except OSError:
+                    pass
+        return fijado
+
+    def uso_bytes(self) -> int:
+        with self._lock:
+            return sum(e.get("bytes", 0) for e in self._entradas.values())
+
+    def _protegida(self, ruta: str, e: dict) -> bool:
+        """Entradas que el LRU nunca desaloja (sin contar las fijadas por otros procesos)"""
+        return ruta in self._fijados or (e.get("tipo") == "images" and e.get("arxiv_id"))
+
+    def _aplicar_cuota(self, proteger: str | None = None):
+        """
+        Desaloja por LRU hasta quedar bajo la cuota. `proteger` es la entrada recién
+        registrada, que quien llama va a usar a continuación. Si lo protegido ya
+        supera la cuota no se desaloja nada: solo se avisa.
+        Debe llamarse con self._lock tomado.
+        """
+        total = sum(e.get("bytes", 0) for e in self._entradas.values())
+        if total <= self.quota_bytes:
+            self._aviso_cuota = False
+            return
+        protegido = sum(e.get("bytes", 0) for r, e in self._entradas.items()
+                        if r == proteger or self._protegida(r, e))
+        if protegido > self.quota_bytes:
+            if not self._aviso_cuota:
+                log.warning("Las entradas protegidas (en uso e imágenes de artículos guardados) ocupan "
+                            "%.1f MB y superan la cuota de %.1f MB: no se desaloja nada",
+                            protegido / (1024 * 1024), self.quota_bytes / (1024 * 1024))
+                self._aviso_cuota = True
+            return
+        self._aviso_cuota = False
+        for ruta, e in sorted(self._entradas.items(), key=lambda kv: kv[1].get("ultimo_acceso", 0)):
+            if total <= self.quota_bytes:
+                break
+            if ruta == proteger or self._protegida(ruta, e) or self._fijado_por_otro(ruta):
+                continue
+            try:
+                if os.path.isdir(ruta):
+                    shutil.rmtree(ruta)
+                elif os.path.exists(ruta):
+                    os.remove(ruta)
+            except OSError as err:
+                log.warning("No se pudo desalojar %s: %s", ruta, err)
+                continue
+            total -= e.get("bytes", 0)
+            del self._entradas[ruta]
+            self._sucio = True
+            log.info("Desalojado (%s): %s", e.get("tipo"), ruta)
@@ -1,39 +1,36 @@
 # app.py CORREGIDO CON SERVICIO DE IMÁGENES MEJORADO
-from flask import Flask, request, render_template, jsonify, send_from_directory
+from flask import Flask, request, render_template, jsonify, send_from_directory, Response, stream_with_context, g
+import logging
 import os
-import json
 import threading
 import time
 
+from configuracion import load_config
 from arxiv_client import ArxivClient
 from arxiv_parser import parse_counts
 from procesador import ProcesadorArticulos
 from almacen import AlmacenMongo   # conexión a Mongo
+from almacen_pdf import AlmacenPDF
+from exportar import generar_jsonl, parse_fecha
+from trazas import configurar_logging, perfilador
 
 app = Flask(__name__)
 
 # ============================
 # CONFIG
 # ============================
-def load_config(path="config.json"):
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
-
 CFG = load_config()
+configurar_logging(CFG)
+log = logging.getLogger(__name__)
 DOWNLOADS_DIR = CFG.get("downloads_dir", "downloads")
 DEFAULT_MAX = int(CFG.get("rf1_max_results", 50))
 
 client = ArxivClient(DOWNLOADS_DIR)
+# almacén de PDFs/XMLs/imágenes con cuota de disco (compartido con el procesador)
+pdf_store = AlmacenPDF.desde_config(CFG)
 
 # Mongo
-mongo_cfg = CFG.get("mongo", {})
-almacen = AlmacenMongo(
-    uri=mongo_cfg.get("uri", "mongodb://localhost:27017"),
-    db_name=mongo_cfg.get("db_name", "cecar_articulos"),
-    collection_name=mongo_cfg.get("collection", "articulos")
-)
+almacen = AlmacenMongo.desde_config(CFG)
 
 # ============================
 # VARIABLES GLOBALES RF2 - CON THREAD SAFETY
@@ -62,7 +59,13 @@ def buscar():
 
     # se descarga el XML y se devuelve la ruta absoluta
     xml_path = client.fetch_and_save(q, start=start, max_results=max_results)
-    counts = parse_counts(xml_path)
+    # fijado mientras se lee: registrar puede desalojar otras entradas del almacén
+    pdf_store.fijar(xml_path)
+    try:
+        pdf_store.registrar(xml_path, "xml")
+        counts = parse_counts(xml_path)
+    finally:
+        pdf_store.liberar(xml_path)
 
     return render_template(
         "resultados.html",
@@ -121,6 +124,7 @@ def progreso():
         "total": progreso_data["total"],
         "elapsed": elapsed,
         "done": is_done,
+        "concurrencia": progreso_data.get("concurrencia"),
         "articulos_url": "/articulos" if is_done else None  # URL para ver artículos
     })
 
@@ -141,21 +145,20 @@ def convertir_rutas_imagenes(articulos):
             web_images = []
             for img_path in articulo["images"]:
                 try:
-                    print(f"DEBUG - Procesando imagen: {img_path}")
-                    print(f"DEBUG - Images dir: {images_dir}")
+                    log.debug("Procesando imagen: %s (images dir: %s)", img_path, images_dir)
                     
                     # Normalizar la ruta de la imagen
                     img_path_norm = os.path.abspath(img_path)
                     
                     # Verificar que el archivo existe
                     if not os.path.exists(img_path_norm):
-                        print(f"WARN - Imagen no existe: {img_path_norm}")
+                        log.warning("Imagen no existe: %s", img_path_norm)
                         continue
                     
                     # Calcular ruta relativa desde el directorio de imágenes
                     try:
                         rel_path = os.path.relpath(img_path_norm, images_dir)
-                        print(f"DEBUG - Ruta relativa calculada: {rel_path}")
+                        log.debug("Ruta relativa calculada: %s", rel_path)
                         
                         # Convertir separadores de Windows a URL
                         url_path = rel_path.replace("\\", "/")
@@ -178,26 +181,26 @@ def convertir_rutas_imagenes(articulos):
                                 url_path = parts[-1]
                         
                         web_url = "/images/" + url_path
-                        print(f"DEBUG - URL web final: {web_url}")
+                        log.debug("URL web final: %s", web_url)
                         
                         # Verificar que la URL resultante corresponde a un archivo real
                         check_path = os.path.join(images_dir, url_path.replace("/", os.sep))
                         if os.path.exists(check_path):
                             web_images.append(web_url)
-                            print(f"SUCCESS - Imagen agregada: {web_url}")
+                            log.debug("Imagen agregada: %s", web_url)
                         else:
-                            print(f"ERROR - Archivo no encontrado para URL: {web_url} -> {check_path}")
+                            log.error("Archivo no encontrado para URL: %s -> %s", web_url, check_path)
                             
                     except Exception as e:
-                        print(f"ERROR - Calculando ruta relativa para {img_path}: {e}")
+                        log.error("Calculando ruta relativa para %s: %s", img_path, e)
                         continue
                         
                 except Exception as e:
-                    print(f"ERROR - Procesando imagen {img_path}: {e}")
+                    log.error("Procesando imagen %s: %s", img_path, e)
                     continue
             
             articulo["images"] = web_images
-            print(f"DEBUG - Imágenes finales para artículo: {web_images}")
+            log.debug("Imágenes finales para artículo: %s", web_images)
     
     return articulos if es_lista else articulos[0]
 
@@ -233,8 +236,34 @@ def ver_articulo(arxiv_id):
 
     # CONVERTIR RUTAS DE IMÁGENES A URLs WEB PARA EL DETALLE
     articulo = convertir_rutas_imagenes(articulo)
+    relacionados = almacen.relacionados.vecinos(arxiv_id) if almacen.relacionados else []
 
-    return render_template("articulo_detalle.html", articulo=articulo)
+    return render_template("articulo_detalle.html", articulo=articulo, relacionados=relacionados)
+
+# ============================
+# EXPORTACIÓN MASIVA (JSONL EN STREAMING)
+# ============================
+@app.route("/exportar")
+def exportar():
+    """
+    /exportar?fields=arxiv_id,title&since=2025-01-01T00:00:00&gzip=1
+    Se envía por bloques desde un cursor de Mongo: nunca se carga la colección entera.
+    since filtra por fecha de última escritura (updated_at), inclusive.
+    """
+    fields = request.args.get("fields")
+    campos = [c.strip() for c in fields.split(",") if c.strip()] if fields else None
+    try:
+        desde = parse_fecha(request.args.get("since"))
+    except ValueError:
+        return jsonify({"error": "since debe ser una fecha ISO 8601"}), 400
+    comprimir = request.args.get("gzip", "0") in ("1", "true", "yes")
+
+    nombre = "articulos.jsonl.gz" if comprimir else "articulos.jsonl"
+    return Response(
+        stream_with_context(generar_jsonl(almacen.col, campos, desde, comprimir)),
+        mimetype="application/gzip" if comprimir else "application/x-ndjson",
+        headers={"Content-Disposition": f"attachment; filename={nombre}"}
+    )
 
 # ============================
 # RUTA PARA SERVIR IMÁGENES - MEJORADA
@@ -247,25 +276,27 @@ def serve_images(filename):
     # Construir ruta completa del archivo
     file_path = os.path.join(images_dir, filename.replace("/", os.sep))
     
-    print(f"DEBUG - Solicitando imagen: {filename}")
-    print(f"DEBUG - Ruta completa: {file_path}")
-    print(f"DEBUG - Archivo existe: {os.path.exists(file_path)}")
+    log.debug("Solicitando imagen: %s -> %s", filename, file_path)
     
     if not os.path.exists(file_path):
-        print(f"ERROR - Imagen no encontrada: {file_path}")
-        # Listar contenido del directorio para debug
-        try:
-            parent_dir = os.path.dirname(file_path)
-            if os.path.exists(parent_dir):
-                print(f"DEBUG - Contenido de {parent_dir}: {os.listdir(parent_dir)}")
-        except Exception as e:
-            print(f"DEBUG - Error listando directorio: {e}")
+        log.error("Imagen no encontrada: %s", file_path)
+        # Listar contenido del directorio para debug (solo si el nivel lo pide: listdir no es gratis)
+        if log.isEnabledFor(logging.DEBUG):
+            try:
+                parent_dir = os.path.dirname(file_path)
+                if os.path.exists(parent_dir):
+                    log.debug("Contenido de %s: %s", parent_dir, os.listdir(parent_dir))
+            except Exception as e:
+                log.debug("Error listando directorio: %s", e)
         return "Imagen no encontrada", 404
     
+    # LRU: la carpeta de imágenes del artículo se marca como usada
+    pdf_store.tocar(os.path.join(images_dir, filename.split("/")[0]))
+
     try:
         return send_from_directory(images_dir, filename)
     except Exception as e:
-        print(f"ERROR - Sirviendo imagen {filename}: {e}")
+        log.error("Sirviendo imagen %s: %s", filename, e)
         return "Error sirviendo imagen", 500
 
 # ============================
@@ -312,6 +343,51 @@ def debug_images():
         "structure": structure
     })
 
+# ============================
+# ADMIN: PERFILADO BAJO DEMANDA
+# ============================
+@app.before_request
+def _iniciar_perfil():
+    g.perfil = perfilador.iniciar("peticiones")
+
+@app.teardown_request
+def _terminar_perfil(exc):
+    perfilador.terminar(g.pop("perfil", None))
+
+def _es_admin():
+    """Con admin_token en config se exige la cabecera X-Admin-Token; sin él, solo localhost"""
+    token = CFG.get("admin_token")
+    if token:
+        return request.headers.get("X-Admin-Token") == token
+    return request.remote_addr in ("127.0.0.1", "::1")
+
+@app.route("/admin/profile", methods=["GET", "POST"])
+def admin_profile():
+    """
+    Sin parámetros devuelve el perfil acumulado.
+    ?n=10&tipo=articulos|peticiones activa cProfile para las próximas n unidades.
+    """
+    if not _es_admin():
+        return jsonify({"error": "No autorizado"}), 403
+
+    n = request.args.get("n")
+    if n is not None:
+        try:
+            perfilador.activar(int(n), request.args.get("tipo", "articulos"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"status": "Perfilado activado", "n": int(n),
+                        "tipo": request.args.get("tipo", "articulos")})
+
+    try:
+        resultado = perfilador.resultado(orden=request.args.get("orden", "cumulative"),
+                                         limite=int(request.args.get("limite", 40)))
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": f"Parámetros de perfil inválidos: {e}"}), 400
+    if request.args.get("formato") == "texto":
+        return Response(resultado["perfil"], mimetype="text/plain")
+    return jsonify(resultado)
+
 # ============================
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
@@ -1,10 +1,13 @@
 # arxiv_client.py
 import os
 import time
+import logging
 import requests
 from urllib.parse import quote_plus
 from sanitizar import slugify
 
+log = logging.getLogger(__name__)
+
 class ArxivClient:
     BASE_URL = "https://export.arxiv.org/api/query"
 
@@ -26,12 +29,9 @@ class ArxivClient:
         fname = f"arxiv_{slugify(query)}_{start}_{max_results}_{stamp}.xml"
         fpath = os.path.join(self.downloads_dir, fname)
 
-        print(f"DEBUG - Guardando XML en: {fpath}")  # DEBUG
-        print(f"DEBUG - Ruta absoluta: {os.path.abspath(fpath)}")  # DEBUG
+        log.debug("Guardando XML en: %s", os.path.abspath(fpath))
 
         with open(fpath, "wb") as f:
             f.write(resp.content)
-
-        print(f"DEBUG - Archivo guardado exitosamente: {os.path.exists(fpath)}")  # DEBUG
         
         return os.path.abspath(fpath)  # Devolver ruta absoluta
\ No newline at end of file
@@ -0,0 +1,210 @@
+# concurrencia.py
+import os
+import threading
+import time
+from collections import deque
+
+try:
+    import psutil  # opcional: medición de CPU en plataformas sin getloadavg (Windows)
+except ImportError:
+    psutil = None
+
+
+class ControladorConcurrencia:
+    """
+    Controlador AIMD (aumento aditivo / reducción multiplicativa) del número de
+    artículos en vuelo. Cada `intervalo_s` revisa la ventana de mediciones:
+    - reduce el límite si hubo respuestas 429, demasiados errores, CPU saturada
+      o la latencia por artículo se degradó respecto a la de referencia (media
+      móvil exponencial de artículos completos: con descarga real y sin error);
+    - en otro caso lo aumenta de a `incremento`, siempre dentro de [minimo, maximo],
+      pero solo si en la ventana se llegó a usar el límite completo: con poca
+      carga el límite no sube sin haberse medido a ese nivel.
+    """
+
+    def __init__(self, inicial=4, minimo=1, maximo=16, incremento=1,
+                 factor_reduccion=0.5, intervalo_s=2.0, tasa_error_max=0.2,
+                 carga_cpu_max=0.9, tolerancia_latencia=1.5, alfa_latencia=0.2,
+                 min_muestras=3, max_decisiones=20):
+        self.minimo = max(1, int(minimo))
+        self.maximo = max(self.minimo, int(maximo))
+        self.limite = min(max(int(inicial), self.minimo), self.maximo)
+        self.incremento = max(1, int(incremento))
+        self.factor_reduccion = float(factor_reduccion)
+        self.intervalo_s = float(intervalo_s)
+        self.tasa_error_max = float(tasa_error_max)
+        self.carga_cpu_max = float(carga_cpu_max)
+        self.tolerancia_latencia = float(tolerancia_latencia)
+        self.alfa_latencia = float(alfa_latencia)
+        self.min_muestras = max(1, int(min_muestras))
+
+        self._cond = threading.Condition()
+        self._en_curso = 0
+
+        # ventana de mediciones desde la última decisión
+        self._resultados = 0
+        self._latencias = []      # solo artículos válidos como referencia de latencia
+        self._etapas = {}
+        self._errores = 0
+        self._throttled = 0
+        self._saturado = False    # si en la ventana _en_curso llegó al límite
+        self._latencia_base = None
+        # getloadavg es una media de 1 minuto: tras una reducción por CPU se espera ese minuto
+        self._ultima_reduccion_cpu = 0.0
+        self._ultimo_ajuste = time.time()
+        self.decisiones = deque(maxlen=max_decisiones)
+
+    @classmethod
+    def desde_config(cls, config: dict):
+        """Construye el controlador desde config.json; sin bloque 'adaptive_concurrency' el límite es fijo."""
+        inicial = int(config.get("concurrency", 4))
+        cfg = config.get("adaptive_concurrency", {})
+        if not cfg.get("enabled", False):
+            return cls(inicial=inicial, minimo=inicial, maximo=inicial)
+        return cls(
+            inicial=inicial,
+            minimo=cfg.get("min", 1),
+            maximo=cfg.get("max", max(inicial, 16)),
+            incremento=cfg.get("increase", 1),
+            factor_reduccion=cfg.get("decrease_factor", 0.5),
+            intervalo_s=cfg.get("interval_s", 2.0),
+            tasa_error_max=cfg.get("max_error_rate", 0.2),
+            carga_cpu_max=cfg.get("max_cpu_load", 0.9),
+            tolerancia_latencia=cfg.get("latency_tolerance", 1.5),
+            alfa_latencia=cfg.get("latency_ewma_alpha", 0.2),
+        )
+
+    # ---------- control de admisión ----------
+    def adquirir(self):
+        """Bloquea hasta que haya cupo bajo el límite actual"""
+        with self._cond:
+            while self._en_curso >= self.limite:
+                self._cond.wait()
+            self._en_curso += 1
+            if self._en_curso >= self.limite:
+                self._saturado = True
+
+    def liberar(self):
+        with self._cond:
+            self._en_curso -= 1
+            self._cond.notify_all()
+
+    # ---------- mediciones ----------
+    def registrar_etapa(self, etapa: str, duracion: float):
+        with self._cond:
+            self._etapas.setdefault(etapa, []).append(duracion)
+
+    def registrar_resultado(self, duracion: float, ok: bool = True, throttled: bool = False,
+                            referencia: bool = True):
+        """
+        Registra un artículo terminado y ajusta el límite si ya pasó el intervalo.
+        - referencia: False para artículos que no sirven como medida de latencia
+          (PDF ya en caché, sin pdf_url...); cuentan para la tasa de error pero no
+          para la latencia.
+        """
+        with self._cond:
+            self._resultados += 1
+            if ok and referencia:
+                self._latencias.append(duracion)
+            if not ok:
+                self._errores += 1
+            if throttled:
+                self._throttled += 1
+            if time.time() - self._ultimo_ajuste >= self.intervalo_s:
+                self._ajustar()
+
+    def _carga_cpu(self):
+        """
+        Carga de CPU normalizada (1.0 = todos los núcleos ocupados) y si es una
+        medida de ventana corta. Con psutil se mide el uso desde la llamada
+        anterior (= la ventana); sin él, la media de 1 minuto de getloadavg.
+        """
+        if psutil is not None:
+            return psutil.cpu_percent(interval=None) / 100.0, True
+        try:
+            return os.getloadavg()[0] / (os.cpu_count() or 1), False
+        except (AttributeError, OSError):
+            return None, False
+
+    def _ajustar(self):
+        """Decide el nuevo límite. Debe llamarse con self._cond tomado."""
+        n = self._resultados
+        if n == 0:
+            return
+        ahora = time.time()
+        latencia = sum(self._latencias) / len(self._latencias) if self._latencias else None
+        hay_muestras = len(self._latencias) >= self.min_muestras
+        tasa_error = self._errores / n
+        carga, carga_corta = self._carga_cpu()
+        cpu_alta = carga is not None and carga > self.carga_cpu_max
+        # con la media de 1 minuto, tras una reducción por CPU se mantiene el límite ese minuto
+        cpu_en_espera = cpu_alta and not carga_corta and ahora - self._ultima_reduccion_cpu < 60
+        etapas = {k: round(sum(v) / len(v), 3) for k, v in self._etapas.items() if v}
+
+        if self._throttled:
+            motivo = f"429 recibidos: {self._throttled}"
+        elif tasa_error > self.tasa_error_max:
+            motivo = f"tasa de error {tasa_error:.0%}"
+        elif cpu_en_espera:
+            motivo = "mantener"
+        elif cpu_alta:
+            motivo = f"carga CPU {carga:.2f}"
+            self._ultima_reduccion_cpu = ahora
+        elif (hay_muestras and self._latencia_base is not None
+              and latencia > self._latencia_base * self.tolerancia_latencia):
+            lenta = max(etapas, key=etapas.get) if etapas else "?"
+            motivo = f"latencia {latencia:.2f}s (referencia {self._latencia_base:.2f}s, etapa lenta: {lenta})"
+        else:
+            motivo = None
+
+        anterior = self.limite
+        if motivo == "mantener":
+            pass
+        elif motivo:
+            self.limite = max(self.minimo, int(self.limite * self.factor_reduccion))
+        elif self._saturado:
+            self.limite = min(self.maximo, self.limite + self.incremento)
+            motivo = "sano"
+        else:
+            motivo = "sin saturar"
+
+        # la referencia sigue a la latencia real (EWMA): una ventana atípica no la fija para siempre
+        if hay_muestras:
+            if self._latencia_base is None:
+                self._latencia_base = latencia
+            else:
+                self._latencia_base += self.alfa_latencia * (latencia - self._latencia_base)
+
+        if self.limite != anterior:
+            self.decisiones.append({
+                "ts": time.time(),
+                "limite_anterior": anterior,
+                "limite": self.limite,
+                "motivo": motivo,
+                "latencia_media": round(latencia, 3) if latencia is not None else None,
+                "etapas": etapas,
+                "carga_cpu": round(carga, 2) if carga is not None else None,
+            })
+            if self.limite > anterior:
+                self._cond.notify_all()
+
+        self._resultados = 0
+        if hay_muestras:
+            # con pocas muestras (artículos lentos) se acumulan hasta la siguiente ventana
+            self._latencias = []
+        self._etapas = {}
+        self._errores = 0
+        self._throttled = 0
+        self._saturado = self._en_curso >= self.limite
+        self._ultimo_ajuste = ahora
+
+    def estado(self):
+        """Snapshot thread-safe para exponer en el progreso"""
+        with self._cond:
+            return {
+                "limite": self.limite,
+                "en_curso": self._en_curso,
+                "minimo": self.minimo,
+                "maximo": self.maximo,
+                "decisiones": list(self.decisiones),
+            }
@@ -0,0 +1,10 @@
+# configuracion.py
+import os
+import json
+
+
+def load_config(path="config.json"):
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
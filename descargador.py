@@ -1,5 +1,8 @@
 # descargador.py
+import io
 import os
+import tempfile
+import threading
 import requests
 from urllib.parse import urlparse
 
@@ -30,11 +33,49 @@ class Descargador:
 
         dest_path = os.path.join(self.downloads_dir, fname)
 
-        # descarga en streaming
+        # descarga en streaming a un archivo temporal: nunca queda un PDF a medias en dest_path.
+        # El nombre lleva pid e hilo: la web y el CLI pueden descargar el mismo PDF a la vez
+        tmp_path = f"{dest_path}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            with requests.get(pdf_url, stream=True, timeout=60) as r:
+                r.raise_for_status()
+                with open(tmp_path, "wb") as f:
+                    for chunk in r.iter_content(chunk_size=8192):
+                        if chunk:
+                            f.write(chunk)
+            os.replace(tmp_path, dest_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return dest_path
+
+    def descargar_en_memoria(self, pdf_url: str, limite_bytes: int) -> tuple:
+        """
+        Descarga el pdf_url sin pasar por downloads_dir.
+        Devuelve (bytes, None) si cabe en `limite_bytes`; si lo supera, vuelca a un
+        archivo temporal y devuelve (None, ruta_temporal). Borrar ese archivo es
+        responsabilidad de quien llama.
+        """
         with requests.get(pdf_url, stream=True, timeout=60) as r:
             r.raise_for_status()
-            with open(dest_path, "wb") as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-        return dest_path
+            declarado = int(r.headers.get("Content-Length") or 0)
+            buf = io.BytesIO()
+            tmp = None
+            try:
+                for chunk in r.iter_content(chunk_size=65536):
+                    if not chunk:
+                        continue
+                    if tmp is None and (declarado > limite_bytes or buf.tell() + len(chunk) > limite_bytes):
+                        tmp = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+                        tmp.write(buf.getvalue())
+                        buf = None
+                    (tmp or buf).write(chunk)
+            except Exception:
+                if tmp is not None:
+                    tmp.close()
+                    os.remove(tmp.name)
+                raise
+        if tmp is not None:
+            tmp.close()
+            return None, tmp.name
+        return buf.getvalue(), None
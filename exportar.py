@@ -0,0 +1,148 @@
+# exportar.py
+"""
+Exportación en streaming de la colección de artículos a JSONL (opcionalmente gzip).
+
+    python exportar.py corpus.jsonl.gz --gzip --fields arxiv_id,title,summary,keywords
+    python exportar.py delta.jsonl --state export_state.json   # incremental por updated_at
+
+La colección se recorre con un cursor del servidor en lotes, así la memoria
+usada es constante sin importar el tamaño del corpus.
+
+La exportación incremental incluye los artículos nuevos y los modificados
+(re-guardados o con keywords refinadas). El estado guarda la última marca
+exportada menos un margen: una escritura que tomó su updated_at antes de esa
+marca pero se confirmó después sigue entrando en la siguiente exportación. A
+cambio, los artículos del margen pueden repetirse entre exportaciones; quien
+consume el JSONL debe tomar la última versión por arxiv_id.
+"""
+import argparse
+import json
+import os
+import sys
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+
+def _json_default(o):
+    if isinstance(o, datetime):
+        return o.isoformat()
+    if isinstance(o, ObjectId):
+        return str(o)
+    raise TypeError(f"Tipo no serializable: {type(o).__name__}")
+
+
+def parse_fecha(texto: str | None) -> datetime | None:
+    """ISO 8601 -> datetime naive en UTC, como los que devuelve pymongo ('Z' y offsets se convierten)"""
+    if not texto:
+        return None
+    fecha = datetime.fromisoformat(texto.replace("Z", "+00:00") if texto.endswith("Z") else texto)
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(timezone.utc).replace(tzinfo=None)
+    return fecha
+
+
+def generar_jsonl(col, campos: list | None = None, desde: datetime | None = None,
+                  comprimir: bool = False, lote: int = 500, resumen: dict | None = None):
+    """
+    Generador de bloques de bytes JSONL (gzip si `comprimir`).
+    - campos: proyección; None exporta el documento completo (sin _id).
+    - desde: solo artículos escritos desde esa fecha, inclusive (updated_at, o
+      created_at en artículos anteriores a updated_at: entonces se reescribía en
+      cada guardado y era la fecha de la última escritura).
+    - resumen: si se pasa, se rellena con "documentos" y "ultimo_updated_at".
+    """
+    query = {"$or": [
+        {"updated_at": {"$gte": desde}},
+        {"updated_at": {"$exists": False}, "created_at": {"$gte": desde}},
+    ]} if desde else {}
+    marcas = ("updated_at", "created_at")
+    proyeccion = {c: 1 for c in campos} if campos else {}
+    proyeccion["_id"] = 0
+    if campos:
+        for c in marcas:
+            proyeccion.setdefault(c, 1)  # necesarias para el resumen incremental
+    resumen = resumen if resumen is not None else {}
+    resumen.update({"documentos": 0, "ultimo_updated_at": desde})
+
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31) if comprimir else None  # wbits=31 -> formato gzip
+    cursor = col.find(query, proyeccion, batch_size=lote).sort("updated_at", 1)
+    buf = []
+    try:
+        for doc in cursor:
+            marca = doc.get("updated_at") or doc.get("created_at")
+            if campos:
+                for c in marcas:
+                    if c not in campos:
+                        doc.pop(c, None)
+            buf.append(json.dumps(doc, ensure_ascii=False, default=_json_default))
+            resumen["documentos"] += 1
+            if marca and (resumen["ultimo_updated_at"] is None or marca > resumen["ultimo_updated_at"]):
+                resumen["ultimo_updated_at"] = marca
+            if len(buf) >= lote:
+                datos = ("\n".join(buf) + "\n").encode("utf-8")
+                buf = []
+                yield compresor.compress(datos) if compresor else datos
+        if buf:
+            datos = ("\n".join(buf) + "\n").encode("utf-8")
+            yield compresor.compress(datos) if compresor else datos
+        if compresor:
+            yield compresor.flush()
+    finally:
+        cursor.close()
+
+
+def main(argv=None):
+    from almacen import AlmacenMongo
+    from configuracion import load_config
+    from trazas import configurar_logging
+
+    parser = argparse.ArgumentParser(description="Exporta la colección de artículos a JSONL")
+    parser.add_argument("salida", help="archivo de salida, o '-' para stdout")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--fields", default=None, help="campos separados por coma (por defecto, todos)")
+    parser.add_argument("--since", default=None, help="solo artículos escritos desde esa fecha (ISO 8601)")
+    parser.add_argument("--state", default=None,
+                        help="archivo con la marca de la última exportación; se lee como --since y se actualiza")
+    parser.add_argument("--margin", type=float, default=300.0,
+                        help="segundos que se retrasa la marca guardada en --state (escrituras tardías)")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    try:
+        desde = parse_fecha(args.since)
+    except ValueError:
+        parser.error(f"--since debe ser una fecha ISO 8601: {args.since!r}")
+    if args.state and os.path.exists(args.state) and not desde:
+        with open(args.state, "r", encoding="utf-8") as f:
+            estado = json.load(f)
+        desde = parse_fecha(estado.get("ultimo_updated_at") or estado.get("ultimo_created_at"))
+    campos = [c.strip() for c in args.fields.split(",") if c.strip()] if args.fields else None
+
+    cfg = load_config(args.config)
+    configurar_logging(cfg)
+    almacen = AlmacenMongo.desde_config(cfg)
+    resumen = {}
+    salida = sys.stdout.buffer if args.salida == "-" else open(args.salida, "wb")
+    try:
+        for bloque in generar_jsonl(almacen.col, campos, desde, args.gzip, args.batch, resumen):
+            salida.write(bloque)
+    finally:
+        if salida is not sys.stdout.buffer:
+            salida.close()
+
+    if args.state and resumen["ultimo_updated_at"]:
+        marca = resumen["ultimo_updated_at"] - timedelta(seconds=args.margin)
+        if desde:
+            marca = max(marca, desde)  # la marca nunca retrocede
+        with open(args.state, "w", encoding="utf-8") as f:
+            json.dump({"ultimo_updated_at": marca.isoformat()}, f)
+    print(f"Exportados {resumen['documentos']} artículos (último updated_at: "
+          f"{resumen['ultimo_updated_at']})", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,12 +8,16 @@ class ExtractorPDF:
         self.images_dir = images_dir
         os.makedirs(self.images_dir, exist_ok=True)
 
-    def extract(self, pdf_path: str, article_slug: str):
+    def extract(self, pdf_path: str | None, article_slug: str, pdf_bytes: bytes | None = None):
         """
         Extrae texto completo y guarda imágenes en una carpeta por artículo.
+        Si se pasa pdf_bytes se abre el PDF desde memoria y pdf_path se ignora.
         Devuelve: {"text": <texto largo>, "images": [<ruta1>, <ruta2>, ...]}
         """
-        doc = fitz.open(pdf_path)
+        if pdf_bytes is not None:
+            doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+        else:
+            doc = fitz.open(pdf_path)
         full_text_parts = []
         saved_images = []
         art_img_dir = os.path.join(self.images_dir, article_slug)
@@ -0,0 +1,135 @@
+# ingesta.py
+"""
+Ingesta masiva sin servidor web (pensada para cron):
+
+    python ingesta.py consultas.txt --max 100 --pages 3 --workers 8
+    cat consultas.txt | python ingesta.py -
+
+Una consulta por línea (las vacías y las que empiezan por # se ignoran).
+La cosecha de XML y el procesamiento de artículos avanzan en paralelo y todos
+los artículos comparten el mismo pool de hilos.
+"""
+import argparse
+import logging
+import sys
+import time
+
+from arxiv_client import ArxivClient
+from arxiv_parser import parse_counts
+from almacen_pdf import AlmacenPDF
+from configuracion import load_config
+from procesador import ProcesadorArticulos
+from trazas import configurar_logging
+
+log = logging.getLogger(__name__)
+
+
+def leer_consultas(fuente) -> list:
+    consultas = []
+    for linea in fuente:
+        linea = linea.strip()
+        if linea and not linea.startswith("#"):
+            consultas.append(linea)
+    return consultas
+
+
+def cosechar(client: ArxivClient, pdf_store: AlmacenPDF, consultas: list, max_results: int,
+             pages: int, delay: float, stats: dict):
+    """
+    Generador de rutas XML: pide cada página de cada consulta a la API de arXiv,
+    respetando `delay` segundos entre llamadas, y corta la paginación cuando una
+    página viene incompleta. Un XML que no se puede leer cuenta como error de
+    cosecha y se pasa a la siguiente consulta.
+    """
+    primera = True
+    for q in consultas:
+        for page in range(pages):
+            if not primera:
+                time.sleep(delay)
+            primera = False
+            start = page * max_results
+            try:
+                xml_path = client.fetch_and_save(q, start=start, max_results=max_results)
+            except Exception as e:
+                log.error("Cosechando '%s' (start=%d): %s", q, start, e)
+                stats["errores_cosecha"] += 1
+                break
+            # fijado hasta que el procesador lo recibe (y lo fija a su vez)
+            pdf_store.fijar(xml_path)
+            try:
+                try:
+                    pdf_store.registrar(xml_path, "xml")
+                    counts = parse_counts(xml_path)
+                except Exception as e:
+                    log.error("XML inválido para '%s' (start=%d): %s", q, start, e)
+                    stats["errores_cosecha"] += 1
+                    break
+                stats["xmls"] += 1
+                stats["encontrados"] += counts["returned_results"]
+                yield xml_path
+            finally:
+                pdf_store.liberar(xml_path)
+            if counts["returned_results"] < max_results or start + max_results >= counts["total_results"]:
+                break
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingesta masiva de arXiv sin servidor web")
+    parser.add_argument("consultas", help="archivo con una consulta por línea, o '-' para stdin")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--max", type=int, default=None, help="resultados por página (rf1_max_results)")
+    parser.add_argument("--pages", type=int, default=1, help="páginas por consulta")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="techo de hilos compartido (sustituye concurrency / adaptive_concurrency.max)")
+    parser.add_argument("--delay", type=float, default=3.0, help="segundos entre llamadas a la API de arXiv")
+    args = parser.parse_args(argv)
+
+    cfg = load_config(args.config)
+    configurar_logging(cfg)
+    if args.workers:
+        adaptativa = cfg.get("adaptive_concurrency", {})
+        if adaptativa.get("enabled", False):
+            adaptativa["max"] = args.workers
+            adaptativa["min"] = min(int(adaptativa.get("min", 1)), args.workers)
+            cfg["concurrency"] = min(int(cfg.get("concurrency", args.workers)), args.workers)
+        else:
+            cfg["concurrency"] = args.workers
+    max_results = args.max or int(cfg.get("rf1_max_results", 50))
+
+    if args.consultas == "-":
+        consultas = leer_consultas(sys.stdin)
+    else:
+        with open(args.consultas, "r", encoding="utf-8") as f:
+            consultas = leer_consultas(f)
+    if not consultas:
+        print("No hay consultas para procesar.")
+        return 1
+
+    client = ArxivClient(cfg.get("downloads_dir", "downloads"))
+    pdf_store = AlmacenPDF.desde_config(cfg)
+    procesador = ProcesadorArticulos(cfg)
+
+    stats = {"xmls": 0, "encontrados": 0, "errores_cosecha": 0}
+    t0 = time.time()
+    resumen = procesador.procesar_xmls(
+        cosechar(client, pdf_store, consultas, max_results, args.pages, args.delay, stats)
+    )
+    segundos = time.time() - t0
+    stats["errores_cosecha"] += resumen["xml_invalidos"]
+
+    procesados = resumen["procesados"]
+    print("=" * 60)
+    print(f"Consultas:           {len(consultas)}")
+    print(f"XML cosechados:      {stats['xmls']} (errores: {stats['errores_cosecha']})")
+    print(f"Artículos:           {procesados} procesados de {stats['encontrados']} encontrados, "
+          f"{resumen['fallidos']} con errores")
+    print(f"Tiempo total:        {segundos:.1f}s")
+    print(f"Rendimiento:         {procesados / segundos if segundos else 0:.2f} artículos/s "
+          f"({procesados * 60 / segundos if segundos else 0:.1f}/min)")
+    print(f"Hilos al terminar:   {procesador.controlador.estado()['limite']}")
+    print(f"Disco gestionado:    {pdf_store.uso_bytes() / (1024 * 1024):.1f} MB")
+    return 0 if stats["errores_cosecha"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,28 @@
 # keywords.py
 import subprocess
 import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
 
-def generar_keywords(texto: str, modelo: str = "gemma3:1b") -> list:
+from keywords_locales import EstadisticasCorpus, extraer_keywords, terminos_documento
+
+log = logging.getLogger(__name__)
+
+KEYWORDS_POR_DEFECTO = ["IA", "machine learning", "control", "sistemas", "optimización"]
+
+
+def generar_keywords(texto: str, modelo: str = "gemma3:1b", fallback: list | None = None) -> list:
     """
     Genera keywords a partir de un texto usando Ollama.
     - texto: título + resumen (+ fragmento del texto completo).
     - modelo: modelo local de Ollama (ej: 'gemma3:1b', 'mistral', etc.)
+    - fallback: keywords a devolver si Ollama falla (por defecto, una lista genérica).
     """
+    return consultar_ollama(texto, modelo) or fallback or KEYWORDS_POR_DEFECTO
+
+
+def consultar_ollama(texto: str, modelo: str = "gemma3:1b") -> list | None:
+    """Keywords generadas por Ollama, o None si falla o no devuelve nada utilizable"""
     prompt = f"""
     Analiza el siguiente texto y devuelve EXACTAMENTE una lista JSON de 5 palabras clave en español.
     - SOLO devuelve una lista JSON de strings, nada de explicaciones, sin clave 'keywords'.
@@ -26,15 +41,15 @@ def generar_keywords(texto: str, modelo: str = "gemma3:1b") -> list:
             errors="replace"
         )
     except Exception as e:
-        print(f"[ERROR] No se pudo ejecutar Ollama: {e}")
-        return ["IA", "machine learning", "control", "sistemas", "optimización"]
+        log.error("No se pudo ejecutar Ollama: %s", e)
+        return None
 
     if result.returncode != 0:
-        print(f"[OLLAMA ERROR] {result.stderr}")
-        return ["IA", "machine learning", "control", "sistemas", "optimización"]
+        log.error("Ollama terminó con error: %s", result.stderr)
+        return None
 
     output_clean = result.stdout.strip()
-    print(f"[OLLAMA RAW OUTPUT]\n{output_clean}\n")
+    log.debug("Salida cruda de Ollama:\n%s", output_clean)
 
     # Intentar parsear como JSON
     try:
@@ -42,14 +57,92 @@ def generar_keywords(texto: str, modelo: str = "gemma3:1b") -> list:
         if isinstance(keywords, list) and all(isinstance(k, str) for k in keywords):
             return keywords[:5]
     except json.JSONDecodeError:
-        print("[WARN] Ollama no devolvió JSON válido")
+        log.warning("Ollama no devolvió JSON válido")
 
     # Si no es JSON válido, intentar rescatar palabras separadas por coma o salto de línea
     candidates = [kw.strip() for kw in output_clean.replace("\n", ",").split(",") if kw.strip()]
     candidates = [kw for kw in candidates if len(kw) > 2]
 
-    # fallback por si no se obtiene nada
-    if not candidates:
-        candidates = ["IA", "machine learning", "control", "sistemas", "optimización"]
+    return candidates[:5] or None
+
+
+class GeneradorKeywords:
+    """
+    Elige cómo se generan las keywords según config["keywords"]["mode"]:
+    - "llm":    solo Ollama (comportamiento original).
+    - "local":  solo el extractor TF-IDF local, sin LLM.
+    - "hybrid": extractor local; Ollama solo si la confianza < min_confidence.
+    - "async":  devuelve las keywords locales y Ollama las refina en segundo
+                plano, actualizando el documento en Mongo al terminar.
+    """
+
+    MODOS = ("llm", "local", "hybrid", "async")
+
+    def __init__(self, config: dict, almacen):
+        cfg = config.get("keywords", {})
+        self.modo = cfg.get("mode", "llm")
+        if self.modo not in self.MODOS:
+            raise ValueError(f"Modo de keywords desconocido: {self.modo}")
+        self.modelo = cfg.get("model", "gemma3:1b")
+        self.min_confianza = float(cfg.get("min_confidence", 0.5))
+        self.min_docs = int(cfg.get("min_corpus_docs", 50))
+        self.almacen = almacen
+        self.estadisticas = EstadisticasCorpus(
+            almacen.db, config.get("mongo", {}).get("keyword_stats_collection", "keyword_stats")
+        )
+        # un solo hilo: Ollama local no gana nada con más paralelismo
+        self._refinador = ThreadPoolExecutor(max_workers=1, thread_name_prefix="KeywordRefiner") \
+            if self.modo == "async" else None
+
+    def generar(self, texto: str, titulo: str = "") -> tuple:
+        """
+        Devuelve (keywords, origen) con origen "llm" o "local". Si Ollama falla se
+        usan las keywords locales y el origen es "local" (así el modo async las
+        refina más tarde).
+        """
+        # Ollama recibe título + texto, como antes de existir el extractor local
+        texto_llm = " ".join(filter(None, [titulo, texto]))
+        if self.modo == "llm":
+            return generar_keywords(texto_llm, modelo=self.modelo), "llm"
+
+        locales, confianza = extraer_keywords(texto, self.estadisticas, titulo=titulo,
+                                              min_docs=self.min_docs)
+        if self.modo == "hybrid" and confianza < self.min_confianza:
+            keywords = consultar_ollama(texto_llm, modelo=self.modelo)
+            if keywords:
+                return keywords, "llm"
+        return locales, "local"
+
+    def registrar_en_corpus(self, arxiv_id: str | None, texto: str, titulo: str = ""):
+        """
+        Suma el artículo a las frecuencias documentales del corpus, una sola vez
+        por artículo: volver a procesarlo (p. ej. la ingesta nocturna repitiendo
+        consultas) no altera el idf.
+        """
+        if self.modo == "llm":
+            return
+        if arxiv_id and not self.almacen.marcar_en_estadisticas(arxiv_id):
+            return
+        self.estadisticas.actualizar(terminos_documento(texto, titulo))
+
+    def refinar_async(self, arxiv_id: str | None, texto: str):
+        """
+        En modo async, encola el refinamiento con Ollama del artículo ya guardado.
+        Si Ollama falla se conservan las keywords locales.
+        """
+        if self._refinador is None or not arxiv_id:
+            return
+        self._refinador.submit(self._refinar, arxiv_id, texto)
+
+    def _refinar(self, arxiv_id, texto):
+        try:
+            keywords = consultar_ollama(texto, modelo=self.modelo)
+            if keywords:
+                self.almacen.actualizar_keywords(arxiv_id, keywords, origen="llm")
+        except Exception as e:
+            log.error("Refinando keywords de %s: %s", arxiv_id, e)
 
-    return candidates[:5]
+    def cerrar(self):
+        """Espera a que terminen los refinamientos pendientes"""
+        if self._refinador is not None:
+            self._refinador.shutdown(wait=True)
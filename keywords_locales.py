@@ -0,0 +1,148 @@
+# keywords_locales.py
+import math
+import re
+
+import numpy as np
+from pymongo import UpdateOne
+
+# Palabras vacías (inglés: idioma de arXiv; español: títulos/resúmenes traducidos)
+STOPWORDS = set("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have having
+he her here hers herself him himself his how i if in into is it its itself just may me might more most must
+my myself no nor not now of off on once only or other our ours ourselves out over own paper propose proposed
+same she should show shows so some such than that the their theirs them themselves then there these they this
+those through to too under until up use used using very via was we well were what when where which while who
+whom why will with within without would you your yours yourself yourselves et al fig figure table section
+eq however thus therefore moreover furthermore based new results result approach method methods work also
+de la que el en y a los del se las por un para con no una su al lo como más pero sus le ya o este sí porque
+esta entre cuando muy sin sobre también me hasta hay donde quien desde todo nos durante todos uno les ni
+contra otros ese eso ante ellos e esto mí antes algunos qué unos yo otro otras otra él tanto esa estos mucho
+quienes nada muchos cual poco ella estar estas algunas algo nosotros mi mis tú te ti tu tus ellas nosotras
+es son fue ser han ha sido
+""".split())
+
+_TOKEN_RE = re.compile(r"[^\W\d_][\w\-]*[^\W_]|[^\W\d_]", re.UNICODE)
+
+# Clave del documento que guarda el número de artículos vistos
+_N_DOCS_ID = "__n_docs__"
+
+
+def tokenizar(texto: str) -> list:
+    return [t.lower() for t in _TOKEN_RE.findall(texto or "")]
+
+
+def candidatos(texto: str) -> tuple:
+    """
+    Devuelve (terminos, posiciones): unigramas y bigramas que no empiezan ni
+    terminan en palabra vacía, con la posición (índice de token) de cada aparición.
+    """
+    tokens = tokenizar(texto)
+    terminos = []
+    posiciones = []
+    for i, tok in enumerate(tokens):
+        if tok in STOPWORDS or len(tok) < 3:
+            continue
+        terminos.append(tok)
+        posiciones.append(i)
+        if i + 1 < len(tokens):
+            sig = tokens[i + 1]
+            if sig not in STOPWORDS and len(sig) >= 3:
+                terminos.append(f"{tok} {sig}")
+                posiciones.append(i)
+    return terminos, posiciones
+
+
+class EstadisticasCorpus:
+    """Frecuencias documentales (df) de términos candidatos, persistidas en Mongo."""
+
+    def __init__(self, db, collection_name="keyword_stats"):
+        self.col = db[collection_name]
+
+    def consultar(self, terminos: list) -> tuple:
+        """Devuelve (n_docs, {termino: df}) para los términos pedidos"""
+        df = {}
+        for d in self.col.find({"_id": {"$in": list(terminos) + [_N_DOCS_ID]}}):
+            df[d["_id"]] = d.get("df", 0)
+        n_docs = df.pop(_N_DOCS_ID, 0)
+        return n_docs, df
+
+    def actualizar(self, terminos: set):
+        """Suma 1 al df de cada término del documento y al total de documentos"""
+        ops = [UpdateOne({"_id": t}, {"$inc": {"df": 1}}, upsert=True) for t in terminos]
+        ops.append(UpdateOne({"_id": _N_DOCS_ID}, {"$inc": {"df": 1}}, upsert=True))
+        self.col.bulk_write(ops, ordered=False)
+
+
+def terminos_documento(texto: str, titulo: str = "") -> set:
+    """Conjunto de términos candidatos de un documento (lo que cuenta para su df)"""
+    terminos, _ = candidatos(f"{titulo}\n{texto}")
+    return set(terminos)
+
+
+def extraer_keywords(texto: str, estadisticas: EstadisticasCorpus | None = None,
+                     titulo: str = "", top: int = 5, min_docs: int = 50) -> tuple:
+    """
+    Extracción TF-IDF con sesgo de posición (estilo YAKE): los términos que
+    aparecen en el título o al principio del texto pesan más.
+    Devuelve (keywords, confianza) con confianza en [0, 1]. No modifica las
+    estadísticas del corpus: eso se hace una vez por artículo nuevo
+    (EstadisticasCorpus.actualizar con terminos_documento()).
+
+    La confianza es el producto de:
+    - corpus: con menos de `min_docs` artículos el idf es poco fiable;
+    - texto: con menos de 60 tokens hay poco de donde extraer;
+    - cobertura: fracción de las `top` keywords que se pudieron elegir;
+    - calidad media de las elegidas: su especificidad en el corpus
+      (1 - df/n_docs, 1 = no aparece en ningún otro artículo) y su soporte en
+      el texto (se repite o está en el título).
+    """
+    terminos, posiciones = candidatos(f"{titulo}\n{texto}")
+    if not terminos:
+        return [], 0.0
+
+    vocab, idx = np.unique(np.array(terminos, dtype=object), return_inverse=True)
+    n_tokens = max(posiciones) + 1
+    tf = np.bincount(idx, minlength=len(vocab)).astype(np.float64)
+    # primera aparición normalizada: 0 = inicio del texto
+    primera = np.full(len(vocab), 1.0)
+    np.minimum.at(primera, idx, np.asarray(posiciones, dtype=np.float64) / n_tokens)
+
+    n_docs, df_map = (0, {})
+    if estadisticas is not None:
+        n_docs, df_map = estadisticas.consultar(vocab.tolist())
+    df = np.array([df_map.get(t, 0) for t in vocab], dtype=np.float64)
+
+    idf = np.log((n_docs + 1.0) / (df + 1.0)) + 1.0
+    es_bigrama = np.array([" " in t for t in vocab])
+    peso_posicion = 1.0 + 1.0 / (1.0 + 10.0 * primera)
+    scores = (1.0 + np.log(tf)) * idf * peso_posicion * np.where(es_bigrama, 1.5, 1.0)
+
+    orden = np.argsort(-scores, kind="stable")
+    elegidos = []
+    indices = []
+    usadas = set()
+    for i in orden:
+        term = vocab[i]
+        # evita keywords solapadas ("deep reinforcement" / "reinforcement learning")
+        palabras = set(term.split(" "))
+        if palabras & usadas:
+            continue
+        elegidos.append(term)
+        indices.append(i)
+        usadas |= palabras
+        if len(elegidos) == top:
+            break
+
+    sel = np.asarray(indices)
+    n_titulo = len(tokenizar(titulo))
+    en_titulo = primera[sel] * n_tokens < n_titulo
+    soporte = np.where(en_titulo, 1.0, np.minimum(1.0, tf[sel] / 2.0))
+    especificidad = 1.0 - np.minimum(1.0, df[sel] / max(n_docs, 1))
+    calidad = float(np.mean(0.5 * especificidad + 0.5 * soporte))
+
+    factor_corpus = min(1.0, math.log1p(n_docs) / math.log1p(min_docs))
+    factor_texto = min(1.0, n_tokens / 60.0)
+    cobertura = len(elegidos) / top
+    confianza = float(np.clip(factor_corpus * factor_texto * cobertura * calidad, 0.0, 1.0))
+    return elegidos, confianza
@@ -1,3 +1,4 @@
+import logging
 import threading
 import time
 import os
@@ -7,34 +8,45 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from descargador import Descargador
 from extractor import ExtractorPDF
 from almacen import AlmacenMongo
-from keywords import generar_keywords
+from almacen_pdf import AlmacenPDF
+from keywords import GeneradorKeywords
+from concurrencia import ControladorConcurrencia
+from trazas import Traza, perfilador
 
 # Namespaces para arXiv Atom
 ATOM_NS = "http://www.w3.org/2005/Atom"
 OPENSEARCH_NS = "http://a9.com/-/spec/opensearch/1.1/"
 NS = {"atom": ATOM_NS, "opensearch": OPENSEARCH_NS}
 
+log = logging.getLogger(__name__)
+
 
 class ProcesadorArticulos:
-    def __init__(self, config: dict, xml_path: str):
+    def __init__(self, config: dict, xml_path: str | None = None):
         self.config = config
         self.xml_path = xml_path
         self.concurrency = int(self.config.get("concurrency", 4))
+        # límite de artículos en vuelo ajustado en caliente (AIMD)
+        self.controlador = ControladorConcurrencia.desde_config(self.config)
         self.downloads_dir = self.config.get("downloads_dir", "downloads")
         self.images_dir = self.config.get("images_dir", "downloads/images")
 
         self.descargador = Descargador(self.downloads_dir)
+        self.pdf_store = AlmacenPDF.desde_config(self.config)
         self.extractor = ExtractorPDF(self.images_dir)
-        mongo_cfg = self.config.get("mongo", {})
-        self.almacen = AlmacenMongo(
-            uri=mongo_cfg.get("uri", "mongodb://localhost:27017"),
-            db_name=mongo_cfg.get("db_name", "cecar_articulos"),
-            collection_name=mongo_cfg.get("collection", "articulos")
-        )
+        # modo en memoria: el PDF va directo a PyMuPDF; por encima de spill_mb se usa un temporal
+        mem_cfg = self.config.get("pdf_in_memory", {})
+        self.pdf_en_memoria = bool(mem_cfg.get("enabled", False))
+        self.pdf_spill_bytes = int(float(mem_cfg.get("spill_mb", 64)) * 1024 * 1024)
+        self.pdf_persistir = bool(mem_cfg.get("persist", False))
+        self.almacen = AlmacenMongo.desde_config(self.config)
+        self.generador_keywords = GeneradorKeywords(self.config, self.almacen)
 
         # THREAD SAFE: progreso compartido con lock
         self.total_a_procesar = 0
         self._procesados = 0  # variable privada
+        self._fallidos = 0
+        self._cosechando = False
         self.progress_lock = threading.Lock()  # lock específico para progreso
         self.stop_monitor = threading.Event()
 
@@ -48,12 +60,7 @@ class ProcesadorArticulos:
         
         with self.almacenes_lock:
             if thread_id not in self.almacenes_por_hilo:
-                mongo_cfg = self.config.get("mongo", {})
-                self.almacenes_por_hilo[thread_id] = AlmacenMongo(
-                    uri=mongo_cfg.get("uri", "mongodb://localhost:27017"),
-                    db_name=mongo_cfg.get("db_name", "cecar_articulos"),
-                    collection_name=mongo_cfg.get("collection", "articulos")
-                )
+                self.almacenes_por_hilo[thread_id] = AlmacenMongo.desde_config(self.config)
         
         return self.almacenes_por_hilo[thread_id]
 
@@ -62,21 +69,29 @@ class ProcesadorArticulos:
         with self.progress_lock:
             self._procesados += 1
 
+    def increment_fallidos(self):
+        with self.progress_lock:
+            self._fallidos += 1
+
     def get_progreso(self):
         """Thread-safe getter del progreso"""
         with self.progress_lock:
-            return {
+            progreso = {
                 "procesados": self._procesados,
+                "fallidos": self._fallidos,
                 "total": self.total_a_procesar
             }
+        progreso["concurrencia"] = self.controlador.estado()
+        return progreso
 
     @property
     def procesados(self):
         """Propiedad thread-safe para compatibilidad"""
         return self.get_progreso()["procesados"]
 
-    def _parse_xml_entries(self):
-        tree = ET.parse(self.xml_path)
+    def _parse_xml_entries(self, xml_path: str | None = None):
+        xml_path = xml_path or self.xml_path
+        tree = ET.parse(xml_path)
         root = tree.getroot()
         entries = []
         for e in root.findall("atom:entry", NS):
@@ -108,7 +123,7 @@ class ProcesadorArticulos:
                 "categories": categories,
                 "arxiv_id": arxiv_id,
                 "pdf_url": pdf_url,
-                "xml_source": os.path.abspath(self.xml_path)
+                "xml_source": os.path.abspath(xml_path)
             })
         return entries
 
@@ -116,71 +131,143 @@ class ProcesadorArticulos:
         """
         Función que ejecutan los hilos: descargar, extraer y guardar.
         CORREGIDO: manejo thread-safe del progreso y conexiones BD
+        Cada etapa es un span de la traza del artículo (ver trazas.py).
         """
-        thread_id = threading.get_ident()
-        print(f"[HILO-{thread_id}] Iniciando procesamiento de {metadata.get('arxiv_id', 'unknown')}")
+        arxiv_id = metadata.get("arxiv_id")
+        log.info("Iniciando procesamiento de %s", arxiv_id or "unknown")
         
+        self.controlador.adquirir()
+        prof = perfilador.iniciar("articulos")
+        traza = Traza(arxiv_id, al_cerrar_span=self.controlador.registrar_etapa)
+        ok = True
+        throttled = False
+        # solo los artículos con descarga real sirven de referencia de latencia al controlador
+        referencia = False
+        pdf_path = None
+        pdf_bytes = None
+        spill_path = None
         try:
             # 1) Descargar PDF
             pdf_url = metadata.get("pdf_url")
-            slug = (metadata.get("arxiv_id") or metadata.get("title", ""))\
+            slug = (arxiv_id or metadata.get("title", ""))\
                 .replace("/", "_").replace(" ", "_")[:120]
             pdf_name = f"{slug}.pdf"
-            pdf_path = None
             
             if pdf_url:
-                try:
-                    pdf_path = self.descargador.descargar_pdf(pdf_url, dest_name=pdf_name)
-                    print(f"[HILO-{thread_id}] PDF descargado: {pdf_path}")
-                except Exception as e:
-                    print(f"[HILO-{thread_id}] [ERROR] No se pudo descargar PDF: {e}")
-                    pdf_path = None
+                with traza.span("descarga") as span:
+                    try:
+                        if self.pdf_en_memoria and not (arxiv_id and self.pdf_store.contiene(arxiv_id)):
+                            pdf_bytes, spill_path = self.descargador.descargar_en_memoria(
+                                pdf_url, self.pdf_spill_bytes)
+                            span["modo"] = "memoria" if pdf_bytes is not None else "temporal"
+                            referencia = True
+                        elif arxiv_id:
+                            # almacén compartido: no se vuelve a descargar un (id, versión) ya presente
+                            span["cache"] = self.pdf_store.contiene(arxiv_id)
+                            pdf_path = self.pdf_store.obtener_pdf(arxiv_id, pdf_url)
+                            referencia = not span["cache"]
+                        else:
+                            pdf_path = self.descargador.descargar_pdf(pdf_url, dest_name=pdf_name)
+                            referencia = True
+                        log.debug("PDF disponible para %s: %s", slug, pdf_path or span.get("modo"))
+                    except Exception as e:
+                        log.error("No se pudo descargar PDF de %s: %s", slug, e)
+                        span["error"] = str(e)
+                        pdf_path = None
+                        ok = False
+                        # arXiv limita la tasa con HTTP 429
+                        throttled = getattr(getattr(e, "response", None), "status_code", None) == 429
 
             # 2) Extraer texto e imágenes
             text = ""
             images = []
-            if pdf_path:
-                try:
-                    res = self.extractor.extract(pdf_path, article_slug=slug or "sin_slug")
-                    text = res.get("text", "")
-                    images = res.get("images", [])
-                    print(f"[HILO-{thread_id}] Texto e imágenes extraídos para {slug}")
-                except Exception as e:
-                    print(f"[HILO-{thread_id}] [ERROR] No se pudo extraer PDF: {e}")
-                    text = ""
-                    images = []
+            if pdf_path or spill_path or pdf_bytes is not None:
+                with traza.span("extraccion") as span:
+                    try:
+                        res = self.extractor.extract(pdf_path or spill_path, article_slug=slug or "sin_slug",
+                                                     pdf_bytes=pdf_bytes)
+                        text = res.get("text", "")
+                        images = res.get("images", [])
+                        if images:
+                            self.pdf_store.registrar(os.path.dirname(images[0]), "images", arxiv_id=arxiv_id)
+                        span["imagenes"] = len(images)
+                        span["caracteres"] = len(text)
+                    except Exception as e:
+                        log.error("No se pudo extraer PDF de %s: %s", slug, e)
+                        span["error"] = str(e)
+                        text = ""
+                        images = []
+                        ok = False
+
+            # 2b) Persistir el PDF descargado en memoria (opcional, después de extraer)
+            if self.pdf_persistir and arxiv_id and (pdf_bytes is not None or spill_path):
+                with traza.span("persistir_pdf") as span:
+                    try:
+                        self.pdf_store.guardar(arxiv_id, datos=pdf_bytes, ruta_origen=spill_path)
+                        spill_path = None  # el temporal ya se movió al almacén
+                    except Exception as e:
+                        log.error("No se pudo persistir el PDF de %s: %s", slug, e)
+                        span["error"] = str(e)
+            pdf_bytes = None
 
-            # 3) Generar keywords con Ollama
+            # 3) Generar keywords (extractor local y/o Ollama según config)
             texto_base = " ".join(filter(None, [
-                metadata.get("title", ""),
                 metadata.get("summary", ""),
                 text[:1500]
             ]))
             
-            try:
-                keywords = generar_keywords(texto_base, modelo="gemma3:1b")
-                print(f"[HILO-{thread_id}] Keywords generadas para {slug}: {keywords}")
-            except Exception as e:
-                print(f"[HILO-{thread_id}] [ERROR] Generando keywords con Ollama: {e}")
-                keywords = []
+            keywords_origen = "llm"
+            with traza.span("keywords") as span:
+                try:
+                    keywords, keywords_origen = self.generador_keywords.generar(
+                        texto_base, titulo=metadata.get("title", ""))
+                    span["origen"] = keywords_origen
+                    log.debug("Keywords (%s) generadas para %s: %s", keywords_origen, slug, keywords)
+                except Exception as e:
+                    log.error("Generando keywords de %s: %s", slug, e)
+                    span["error"] = str(e)
+                    keywords = []
+                    ok = False
 
             # 4) Guardar en Mongo - USANDO CONEXIÓN ESPECÍFICA DEL HILO
-            try:
-                almacen_hilo = self._get_almacen_for_thread()
-                almacen_hilo.guardar_articulo(metadata, text, images, keywords)
-                print(f"[HILO-{thread_id}] Artículo guardado en Mongo: {slug}")
-            except Exception as e:
-                print(f"[HILO-{thread_id}] [ERROR] Guardando en Mongo: {e}")
+            with traza.span("almacen") as span:
+                try:
+                    almacen_hilo = self._get_almacen_for_thread()
+                    almacen_hilo.guardar_articulo(metadata, text, images, keywords, keywords_origen)
+                    log.info("Artículo guardado en Mongo: %s", slug)
+                    self.generador_keywords.registrar_en_corpus(
+                        arxiv_id, texto_base, titulo=metadata.get("title", ""))
+                    if keywords_origen == "local":
+                        self.generador_keywords.refinar_async(
+                            arxiv_id,
+                            " ".join(filter(None, [metadata.get("title", ""), texto_base])))
+                except Exception as e:
+                    log.error("Guardando %s en Mongo: %s", slug, e)
+                    span["error"] = str(e)
+                    ok = False
 
             # THREAD SAFE: update progreso
             self.increment_procesados()
             return True
             
         except Exception as e:
-            print(f"[HILO-{thread_id}] [ERROR] Fallo inesperado en procesar artículo: {e}")
+            log.exception("Fallo inesperado en procesar artículo %s: %s", arxiv_id, e)
             # Incrementar contador incluso en caso de error
             self.increment_procesados()
+            ok = False
             return False
+        finally:
+            if pdf_path and arxiv_id:
+                self.pdf_store.liberar(pdf_path)
+            if spill_path and os.path.exists(spill_path):
+                os.remove(spill_path)
+            if not ok:
+                self.increment_fallidos()
+            self.controlador.liberar()
+            self.controlador.registrar_resultado(traza.duracion(), ok=ok, throttled=throttled,
+                                                 referencia=referencia)
+            traza.finalizar(ok=ok, throttled=throttled)
+            perfilador.terminar(prof)
 
     def _monitor(self, start_ts):
         """Monitor thread-safe del progreso"""
@@ -190,48 +277,85 @@ class ProcesadorArticulos:
             t = progreso["total"]
             
             elapsed = int(time.time() - start_ts)
-            print(f"[Monitor] Procesados: {p}/{t} — Tiempo transcurrido: {elapsed}s")
+            concurrencia = progreso["concurrencia"]
+            log.info("[Monitor] Procesados: %d/%d — Hilos activos: %d (límite %d) — Tiempo transcurrido: %ds",
+                     p, t, concurrencia["en_curso"], concurrencia["limite"], elapsed)
             
-            if p >= t:
+            if p >= t and not self._cosechando:
                 break
             
             self.stop_monitor.wait(timeout=1)
 
     def run(self):
-        entries = self._parse_xml_entries()
-        self.total_a_procesar = len(entries)
-        
-        if self.total_a_procesar == 0:
-            print("No hay artículos para procesar en el XML.")
-            return
+        """Procesa el XML indicado en el constructor"""
+        return self.procesar_xmls([self.xml_path])
 
-        print(f"Iniciando procesamiento de {self.total_a_procesar} artículos con {self.concurrency} hilos.")
+    def procesar_xmls(self, xml_paths):
+        """
+        Procesa los artículos de varios XML con un único pool de hilos (presupuesto
+        compartido). `xml_paths` puede ser un generador: cada XML se encola en cuanto
+        llega, así la cosecha y el procesamiento avanzan en paralelo.
+        Un XML ilegible se registra en el log y se salta sin abortar el lote.
+        Devuelve un resumen con procesados, fallidos, xml_invalidos y segundos.
+        """
+        estado = self.controlador.estado()
+        log.info("Iniciando procesamiento con %d hilos (rango %d-%d).",
+                 estado["limite"], estado["minimo"], estado["maximo"])
 
         start_ts = time.time()
+        self._cosechando = True
         monitor_thread = threading.Thread(target=self._monitor, args=(start_ts,), daemon=True)
         monitor_thread.start()
 
-        # Usar ThreadPoolExecutor para mejor control de concurrencia
-        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="ArticleProcessor") as executor:
-            # Enviar todas las tareas
-            futures = [executor.submit(self._procesar_un_articulo, entry) for entry in entries]
-            
+        fijados = []
+        futures = []
+        xml_invalidos = 0
+        # El pool se dimensiona al techo; el controlador limita cuántos trabajan a la vez
+        with ThreadPoolExecutor(max_workers=self.controlador.maximo, thread_name_prefix="ArticleProcessor") as executor:
+            try:
+                for xml_path in xml_paths:
+                    try:
+                        entries = self._parse_xml_entries(xml_path)
+                    except Exception as e:
+                        log.error("XML inválido %s: %s", xml_path, e)
+                        xml_invalidos += 1
+                        continue
+                    if not entries:
+                        log.warning("No hay artículos para procesar en el XML %s.", xml_path)
+                        continue
+                    # el XML de la búsqueda no se desaloja mientras se procesa
+                    self.pdf_store.fijar(xml_path)
+                    fijados.append(xml_path)
+                    with self.progress_lock:
+                        self.total_a_procesar += len(entries)
+                    futures.extend(executor.submit(self._procesar_un_articulo, entry) for entry in entries)
+            except Exception as e:
+                # la fuente de XMLs falló: se terminan los artículos ya encolados
+                log.error("Error obteniendo XMLs: %s", e)
+            finally:
+                self._cosechando = False
+
             # Procesar resultados conforme se completan
             for fut in as_completed(futures):
                 try:
                     resultado = fut.result()
                     if not resultado:
-                        print("[WARNING] Un hilo falló en el procesamiento")
+                        log.warning("Un hilo falló en el procesamiento")
                 except Exception as e:
-                    print(f"[ERROR] Excepción en hilo: {e}")
+                    log.error("Excepción en hilo: %s", e)
 
         # Finalizar monitor
         self.stop_monitor.set()
+        # Esperar refinamientos de keywords pendientes (modo async)
+        self.generador_keywords.cerrar()
+        for xml_path in fijados:
+            self.pdf_store.liberar(xml_path)
         monitor_thread.join(timeout=2)
         
-        total_time = int(time.time() - start_ts)
+        total_time = time.time() - start_ts
         final_progress = self.get_progreso()
-        print(f"Procesamiento finalizado. Procesados: {final_progress['procesados']}/{final_progress['total']}. Tiempo total: {total_time}s")
+        log.info("Procesamiento finalizado. Procesados: %d/%d. Tiempo total: %ds",
+                 final_progress["procesados"], final_progress["total"], int(total_time))
 
         # Limpiar conexiones de hilos
         with self.almacenes_lock:
@@ -240,4 +364,11 @@ class ProcesadorArticulos:
                     almacen.client.close()
                 except:
                     pass
-            self.almacenes_por_hilo.clear()
\ No newline at end of file
+            self.almacenes_por_hilo.clear()
+
+        return {
+            "procesados": final_progress["procesados"],
+            "fallidos": final_progress["fallidos"],
+            "xml_invalidos": xml_invalidos,
+            "segundos": total_time,
+        }
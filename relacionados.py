@@ -0,0 +1,136 @@
+# relacionados.py
+import math
+from collections import Counter
+
+from pymongo import UpdateMany, UpdateOne
+
+from keywords_locales import STOPWORDS, tokenizar
+
+
+def vectorizar(title: str, summary: str, keywords: list, estadisticas=None, max_terminos: int = 40) -> dict:
+    """
+    Vector TF-IDF disperso {termino: peso} normalizado (L2) a partir de título,
+    resumen y keywords. El título y las keywords pesan más que el resumen.
+    El idf sale de las frecuencias documentales que mantiene el extractor de
+    keywords (EstadisticasCorpus); sin estadísticas todos los términos tienen
+    idf 1. Solo se guardan los `max_terminos` más pesados para acotar el índice
+    invertido.
+    """
+    tf = Counter()
+    for fuente, peso in ((title, 2.0), (summary, 1.0), (" ".join(keywords or []), 3.0)):
+        for tok in tokenizar(fuente):
+            if tok not in STOPWORDS and len(tok) >= 3:
+                tf[tok] += peso
+    if not tf:
+        return {}
+    n_docs, df = estadisticas.consultar(list(tf)) if estadisticas is not None else (0, {})
+    pesos = {t: (1.0 + math.log(f)) * (math.log((n_docs + 1.0) / (df.get(t, 0) + 1.0)) + 1.0)
+             for t, f in tf.items()}
+    pesos = dict(sorted(pesos.items(), key=lambda kv: kv[1], reverse=True)[:max_terminos])
+    norma = math.sqrt(sum(w * w for w in pesos.values())) or 1.0
+    return {t: w / norma for t, w in pesos.items()}
+
+
+class IndiceRelacionados:
+    """
+    Índice de artículos relacionados con los vecinos top-k precalculados.
+    Cada documento guarda su vector (terminos/pesos, con índice multikey sobre
+    `terminos` que hace de índice invertido) y la lista `vecinos` ya ordenada.
+    Se actualiza incrementalmente al guardar un artículo: se buscan los artículos
+    que comparten alguno de sus `terminos_consulta` términos más pesados (los más
+    específicos, por el idf), se ordenan por cuántos comparten y se puntúan los
+    `max_candidatos` primeros; el nuevo entra como vecino de los que supera al
+    peor de su lista.
+    """
+
+    def __init__(self, db, collection_name="relacionados", k=5, max_candidatos=2000,
+                 terminos_consulta=10, estadisticas=None):
+        self.col = db[collection_name]
+        self.k = k
+        self.max_candidatos = max_candidatos
+        self.terminos_consulta = terminos_consulta
+        self.estadisticas = estadisticas
+        self.col.create_index("terminos")
+        self.col.create_index("vecinos.arxiv_id")
+
+    def indexar(self, doc: dict):
+        arxiv_id = doc.get("arxiv_id")
+        if not arxiv_id:
+            return
+        vector = vectorizar(doc.get("title", ""), doc.get("summary", ""), doc.get("keywords", []),
+                            self.estadisticas)
+        if not vector:
+            return
+
+        # el vector ya viene ordenado por peso: se consulta por los términos más específicos
+        consulta = list(vector)[:self.terminos_consulta]
+        candidatos = self.col.aggregate([
+            {"$match": {"terminos": {"$in": consulta}, "_id": {"$ne": arxiv_id}}},
+            {"$addFields": {"_comunes": {"$size": {"$setIntersection": ["$terminos", consulta]}}}},
+            {"$sort": {"_comunes": -1}},
+            {"$limit": self.max_candidatos},
+            {"$project": {"terminos": 1, "pesos": 1, "title": 1, "vecinos": 1}},
+        ])
+
+        # una entrada anterior de este artículo (re-guardado, keywords refinadas) se
+        # quita siempre de las listas de vecinos: su score ya no es válido
+        ops = [UpdateMany({"vecinos.arxiv_id": arxiv_id, "_id": {"$ne": arxiv_id}},
+                          {"$pull": {"vecinos": {"arxiv_id": arxiv_id}}})]
+        puntuados = []
+        for c in candidatos:
+            score = sum(vector.get(t, 0.0) * w for t, w in zip(c["terminos"], c["pesos"]))
+            if score <= 0:
+                continue
+            puntuados.append({"arxiv_id": c["_id"], "title": c.get("title"), "score": round(score, 4)})
+
+            # ¿entra el nuevo artículo en el top-k del candidato?
+            vecinos = [v for v in c.get("vecinos", []) if v["arxiv_id"] != arxiv_id]
+            if len(vecinos) < self.k or score > vecinos[-1]["score"]:
+                ops.append(UpdateOne({"_id": c["_id"]}, {"$push": {"vecinos": {
+                    "$each": [{"arxiv_id": arxiv_id, "title": doc.get("title"), "score": round(score, 4)}],
+                    "$sort": {"score": -1},
+                    "$slice": self.k,
+                }}}))
+
+        puntuados.sort(key=lambda v: v["score"], reverse=True)
+        ops.append(UpdateOne({"_id": arxiv_id}, {"$set": {
+            "title": doc.get("title"),
+            "terminos": list(vector),
+            "pesos": list(vector.values()),
+            "vecinos": puntuados[:self.k],
+        }}, upsert=True))
+        self.col.bulk_write(ops, ordered=True)
+
+    def vecinos(self, arxiv_id: str) -> list:
+        """Vecinos precalculados: una sola lectura por _id"""
+        d = self.col.find_one({"_id": arxiv_id}, {"vecinos": 1})
+        return d.get("vecinos", []) if d else []
+
+    def reconstruir(self, articulos_col):
+        """Reindexa toda la colección de artículos (para corpus previos al índice)"""
+        self.col.delete_many({})
+        cursor = articulos_col.find(
+            {"arxiv_id": {"$ne": None}},
+            {"arxiv_id": 1, "title": 1, "summary": 1, "keywords": 1},
+            no_cursor_timeout=True,
+        )
+        n = 0
+        try:
+            for doc in cursor:
+                self.indexar(doc)
+                n += 1
+        finally:
+            cursor.close()
+        return n
+
+
+if __name__ == "__main__":
+    from almacen import AlmacenMongo
+    from configuracion import load_config
+    from trazas import configurar_logging
+
+    cfg = load_config()
+    configurar_logging(cfg)
+    almacen = AlmacenMongo.desde_config(cfg)
+    n = almacen.relacionados.reconstruir(almacen.col)
+    print(f"Índice de relacionados reconstruido: {n} artículos")
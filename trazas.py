@@ -0,0 +1,181 @@
+# trazas.py
+"""
+Logging estructurado, trazas por artículo y perfilado bajo demanda.
+
+- configurar_logging(): niveles y formato para todos los módulos (logging estándar).
+- Traza: spans (descarga, extraccion, keywords, almacen...) de un artículo; al
+  cerrarse se escribe como una línea JSON en el archivo de trazas.
+- Perfilador: activa cProfile para los próximos N artículos o peticiones y
+  acumula el resultado para consultarlo desde /admin/profile.
+"""
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+_trazas_log = logging.getLogger("trazas")
+_trazas_log.propagate = False  # las trazas van solo a su archivo JSONL
+
+
+def configurar_logging(config: dict):
+    """Configura el logging raíz y el archivo de trazas desde config["logging"]"""
+    cfg = config.get("logging", {})
+    logging.basicConfig(
+        level=getattr(logging, str(cfg.get("level", "INFO")).upper(), logging.INFO),
+        format="%(asctime)s %(levelname)s [%(threadName)s] %(name)s: %(message)s",
+    )
+    trace_file = cfg.get("trace_file")
+    if trace_file and not _trazas_log.handlers:
+        os.makedirs(os.path.dirname(os.path.abspath(trace_file)), exist_ok=True)
+        handler = logging.FileHandler(trace_file, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _trazas_log.addHandler(handler)
+        _trazas_log.setLevel(logging.INFO)
+
+
+class Traza:
+    """
+    Traza de un artículo. Uso:
+
+        traza = Traza(arxiv_id)
+        with traza.span("descarga") as span:
+            ...
+            span["bytes"] = n   # atributos opcionales
+        traza.finalizar(ok=True)
+
+    `al_cerrar_span(nombre, duracion)` permite reenviar cada duración (p. ej. al
+    controlador de concurrencia).
+    """
+
+    def __init__(self, arxiv_id: str | None, al_cerrar_span=None):
+        self.arxiv_id = arxiv_id
+        self.al_cerrar_span = al_cerrar_span
+        self.inicio_ts = time.time()
+        self._inicio = time.perf_counter()
+        self.spans = []
+
+    @contextmanager
+    def span(self, nombre: str):
+        span = {"nombre": nombre, "inicio_ms": round((time.perf_counter() - self._inicio) * 1000, 1)}
+        t0 = time.perf_counter()
+        try:
+            yield span
+        except Exception as e:
+            span["error"] = str(e)
+            raise
+        finally:
+            duracion = time.perf_counter() - t0
+            span["duracion_ms"] = round(duracion * 1000, 1)
+            self.spans.append(span)
+            if self.al_cerrar_span:
+                self.al_cerrar_span(nombre, duracion)
+
+    def duracion(self) -> float:
+        return time.perf_counter() - self._inicio
+
+    def finalizar(self, ok: bool = True, **extra):
+        if not _trazas_log.handlers:
+            return
+        registro = {
+            "ts": self.inicio_ts,
+            "arxiv_id": self.arxiv_id,
+            "hilo": threading.current_thread().name,
+            "ok": ok,
+            "duracion_ms": round(self.duracion() * 1000, 1),
+            "spans": self.spans,
+        }
+        registro.update(extra)
+        _trazas_log.info(json.dumps(registro, ensure_ascii=False))
+
+
+class Perfilador:
+    """
+    cProfile bajo demanda. `activar(n, tipo)` arma el perfilado de las próximas
+    `n` unidades del tipo dado ("articulos" o "peticiones"); cada unidad se
+    perfila con su propio cProfile.Profile (uno por hilo) y se acumula en un
+    pstats.Stats común.
+    """
+
+    TIPOS = ("articulos", "peticiones")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pendientes = {t: 0 for t in self.TIPOS}
+        self._completados = 0
+        self._stats = None
+        self._tipo = None
+
+    def activar(self, n: int, tipo: str = "articulos"):
+        if tipo not in self.TIPOS:
+            raise ValueError(f"Tipo de perfilado desconocido: {tipo}")
+        with self._lock:
+            self._pendientes = {t: 0 for t in self.TIPOS}
+            self._pendientes[tipo] = max(0, int(n))
+            self._completados = 0
+            self._stats = None
+            self._tipo = tipo
+        log.info("Perfilado activado para %d %s", n, tipo)
+
+    def iniciar(self, tipo: str):
+        """Devuelve un Profile ya habilitado si hay que perfilar esta unidad, si no None"""
+        if not self._pendientes.get(tipo):  # lectura sin lock: camino rápido cuando está apagado
+            return None
+        with self._lock:
+            if self._pendientes[tipo] <= 0:
+                return None
+            self._pendientes[tipo] -= 1
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            # otro profiler ya activo en este hilo
+            with self._lock:
+                self._pendientes[tipo] += 1
+            return None
+        return prof
+
+    def terminar(self, prof):
+        if prof is None:
+            return
+        prof.disable()
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(prof)
+            else:
+                self._stats.add(prof)
+            self._completados += 1
+
+    @contextmanager
+    def perfilar(self, tipo: str):
+        prof = self.iniciar(tipo)
+        try:
+            yield
+        finally:
+            self.terminar(prof)
+
+    def resultado(self, orden: str = "cumulative", limite: int = 40) -> dict:
+        with self._lock:
+            estado = {
+                "tipo": self._tipo,
+                "completados": self._completados,
+                "pendientes": self._pendientes.get(self._tipo, 0) if self._tipo else 0,
+            }
+            if self._stats is None:
+                estado["perfil"] = ""
+                return estado
+            salida = io.StringIO()
+            self._stats.stream = salida
+            self._stats.sort_stats(orden).print_stats(limite)
+        estado["perfil"] = salida.getvalue()
+        return estado
+
+
+# instancia compartida por el procesador y la app
+perfilador = Perfilador()